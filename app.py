@@ -1,19 +1,30 @@
 #!/usr/bin/env python3
 import argparse
+import asyncio
 import hashlib
+import html
 import logging
 import os
 import re
+import shutil
+import sys
 import tempfile
-from typing import List, Optional, Dict, Any
-from urllib.parse import urlsplit, urlunsplit
+import threading
+import wave
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Dict, Any, Iterator, Tuple, Union
 
 from fastapi import FastAPI, HTTPException, Form
-from fastapi.responses import HTMLResponse, RedirectResponse
-from pydantic import BaseModel, Field
+from fastapi.responses import HTMLResponse, ORJSONResponse, RedirectResponse, StreamingResponse
+from pydantic import BaseModel, Field, field_validator
+import ctranslate2
+import diskcache
+import numpy as np
 import uvicorn
 import yt_dlp
-from faster_whisper import WhisperModel
+from faster_whisper import BatchedInferencePipeline, WhisperModel
+from faster_whisper.feature_extractor import FeatureExtractor
 
 # -------------------------------------------------
 # Logging
@@ -36,6 +47,10 @@ if COOKIES_TEXT:
         f.write(COOKIES_TEXT)
     logging.info("Materialized COOKIES_TEXT at %s (len=%d)", _COOKIES_TEXT_FILE, len(COOKIES_TEXT))
 
+# Scratch space for downloaded audio only: RAM-backed /dev/shm when present (REEL_TMP
+# overrides). Each download dir is removed once its audio has been transcribed.
+REEL_TMP = os.environ.get("REEL_TMP") or ("/dev/shm" if os.path.isdir("/dev/shm") else None)
+
 # User-Agent (can override with USER_AGENT env)
 USER_AGENT = os.environ.get("USER_AGENT") or (
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
@@ -46,36 +61,187 @@ USER_AGENT = os.environ.get("USER_AGENT") or (
 # -------------------------------------------------
 # URL cleaning & validation
 # -------------------------------------------------
+# Scheme and a leading /<username>/ segment are optional, as in links copied from the app
 INSTAGRAM_RE = re.compile(
-    r"^https?://(www\.)?instagram\.com/reels?/[A-Za-z0-9_\-]+/?$",
+    r"^(?:https?://)?(?:www\.|m\.)?instagram\.com/(?:[A-Za-z0-9_.]+/)?reels?/([A-Za-z0-9_\-]+)/?",
     re.IGNORECASE,
 )
 
 def _clean_instagram_reel_url(url: str) -> str:
-    parsed = urlsplit(url)
-    parts = [p for p in parsed.path.split("/") if p]
-    try:
-        if "reel" in parts:
-            i = parts.index("reel")
-        elif "reels" in parts:
-            i = parts.index("reels")
-        else:
-            raise ValueError
-        reel_id = parts[i + 1]
-        cleaned_path = f"/reel/{reel_id}"
-    except Exception:
+    m = INSTAGRAM_RE.match(url.strip())
+    if not m:
         raise ValueError("URL does not contain a valid Instagram reel id.")
-    return urlunsplit((parsed.scheme or "https", parsed.netloc or "www.instagram.com", cleaned_path, "", ""))
+    return f"https://www.instagram.com/reel/{m.group(1)}"
 
 # -------------------------------------------------
 # Whisper model (lazy init)
 # -------------------------------------------------
-_MODEL = None
-def get_model(model_size: str = "small", compute_type: str = "int8") -> WhisperModel:
-    global _MODEL
-    if _MODEL is None:
-        _MODEL = WhisperModel(model_size, device="cpu", compute_type=compute_type)
-    return _MODEL
+DEVICE = os.environ.get("DEVICE", "auto").strip().lower()
+
+def _resolve_device() -> str:
+    # Explicit DEVICE=cpu/cuda wins; otherwise use CUDA whenever a GPU is visible
+    if DEVICE in {"cpu", "cuda"}:
+        return DEVICE
+    try:
+        return "cuda" if ctranslate2.get_cuda_device_count() > 0 else "cpu"
+    except Exception:
+        return "cpu"
+
+class _CudaFeatureExtractor(FeatureExtractor):
+    # Same log-mel as FeatureExtractor, but STFT + mel projection run on the GPU
+    # torch is optional and imported lazily, only on CUDA hosts
+    def __init__(self, **kwargs):
+        import torch
+        super().__init__(**kwargs)
+        self._window = torch.hann_window(self.n_fft, device="cuda")
+        self._mel_filters = torch.from_numpy(self.mel_filters).to("cuda")
+
+    def __call__(self, waveform: np.ndarray, padding=160, chunk_length=None):
+        import torch
+        if chunk_length is not None:
+            self.n_samples = chunk_length * self.sampling_rate
+            self.nb_max_frames = self.n_samples // self.hop_length
+        audio = torch.as_tensor(waveform, dtype=torch.float32).to("cuda", non_blocking=True)
+        if padding:
+            audio = torch.nn.functional.pad(audio, (0, padding))
+        stft = torch.stft(audio, self.n_fft, self.hop_length, window=self._window, return_complex=True)
+        magnitudes = stft[..., :-1].abs() ** 2
+        log_spec = torch.clamp(self._mel_filters @ magnitudes, min=1e-10).log10()
+        log_spec = torch.maximum(log_spec, log_spec.max() - 8.0)
+        log_spec = (log_spec + 4.0) / 4.0
+        return log_spec.cpu().numpy()
+
+# model_size accepts openai sizes (small, large-v3, ...), Distil-Whisper names
+# (distil-small.en, distil-large-v3, ...) or any CT2 repo id / local directory
+# such as "Systran/faster-distil-whisper-large-v3"
+_MODELS: "OrderedDict[Tuple[str, str], BatchedInferencePipeline]" = OrderedDict()
+_MODELS_LOCK = threading.Lock()
+MAX_LOADED_MODELS = int(os.environ.get("MAX_LOADED_MODELS", "2"))
+
+# API callers may only pick from these: just the configured MODEL_SIZE unless
+# ALLOWED_MODEL_SIZES opts in to more (comma-separated)
+ALLOWED_MODEL_SIZES = {
+    m.strip() for m in os.environ.get("ALLOWED_MODEL_SIZES", "").split(",") if m.strip()
+} | {os.environ.get("MODEL_SIZE", "small")}
+ALLOWED_COMPUTE_TYPES = {
+    "auto", "default", "int8", "int8_float16", "int8_float32", "int8_bfloat16",
+    "int16", "bfloat16", "float16", "float32",
+}
+
+# One CT2 replica per process: a transcribe() call only ever runs on one replica,
+# and each replica gets its own cpu_threads, so extra replicas only split the cores
+CT2_NUM_WORKERS = 1
+
+def _cpu_threads() -> int:
+    # Split the cores between server processes (WEB_CONCURRENCY, set by --serve and
+    # read by uvicorn); a lone uvicorn process gets every core
+    web_workers = max(int(os.environ.get("WEB_CONCURRENCY") or 1), 1)
+    return max((os.cpu_count() or 1) // web_workers, 1)
+
+def _load_model(model_size: str, compute_type: str) -> BatchedInferencePipeline:
+    device = _resolve_device()
+    if device == "cuda" and compute_type == "auto":
+        compute_type = "float16"
+    logging.info("Loading Whisper %s on %s (%s)", model_size, device, compute_type)
+    # Batched pipeline decodes 30s windows in parallel; VAD is applied per call
+    # "auto" lets CTranslate2 pick the fastest kernel the host supports
+    whisper = WhisperModel(
+        model_size,
+        device=device,
+        compute_type=compute_type,
+        cpu_threads=_cpu_threads(),
+        num_workers=CT2_NUM_WORKERS,
+    )
+    if device == "cuda":
+        try:
+            import torch
+        except ImportError:
+            torch = None
+        if torch is not None and torch.cuda.is_available():
+            whisper.feature_extractor = _CudaFeatureExtractor(**whisper.feat_kwargs)
+    return BatchedInferencePipeline(whisper)
+
+_MODEL_LOAD_LOCKS: Dict[Tuple[str, str], threading.Lock] = {}
+
+def get_model(model_size: str = "small", compute_type: str = "auto") -> BatchedInferencePipeline:
+    key = (model_size, compute_type)
+    # _MODELS_LOCK only guards the dict; loading (possibly a long download) happens
+    # under a per-key lock so other models stay usable and nothing loads twice
+    with _MODELS_LOCK:
+        if key in _MODELS:
+            _MODELS.move_to_end(key)
+            return _MODELS[key]
+        load_lock = _MODEL_LOAD_LOCKS.setdefault(key, threading.Lock())
+    with load_lock:
+        with _MODELS_LOCK:
+            if key in _MODELS:
+                _MODELS.move_to_end(key)
+                return _MODELS[key]
+        pipeline = _load_model(model_size, compute_type)
+        with _MODELS_LOCK:
+            _MODELS[key] = pipeline
+            _MODEL_LOAD_LOCKS.pop(key, None)
+            while len(_MODELS) > max(MAX_LOADED_MODELS, 1):
+                evicted, _ = _MODELS.popitem(last=False)
+                logging.info("Unloading Whisper %s (%s)", *evicted)
+        return pipeline
+
+def warm_model(model_size: str, compute_type: str) -> None:
+    model = get_model(model_size=model_size, compute_type=compute_type)
+    # One second of silence through the plain model so CT2 picks its kernels now,
+    # not on the first real request (VAD would drop silence in the batched path)
+    silence = np.zeros(16000, dtype=np.float32)
+    try:
+        segments, _ = model.model.transcribe(silence, language="en", beam_size=1)
+        for _ in segments:
+            pass
+    except Exception as e:
+        logging.warning("Model warm-up pass failed: %s", e)
+
+# -------------------------------------------------
+# Transcript cache (keyed by reel id + decoding settings)
+# -------------------------------------------------
+CACHE_DIR = os.environ.get("CACHE_DIR") or os.path.join(tempfile.gettempdir(), "reel_transcripts")
+CACHE_SIZE_MB = int(os.environ.get("CACHE_SIZE_MB", "256"))
+_CACHE = diskcache.Cache(
+    CACHE_DIR,
+    size_limit=CACHE_SIZE_MB * 1024 * 1024,
+    eviction_policy="least-recently-used",
+)
+
+def _cache_key(url: str, language: Optional[str], model_size: str, compute_type: str, initial_prompt: Optional[str] = None) -> tuple:
+    # url must already be cleaned: https://www.instagram.com/reel/<id>
+    reel_id = url.rsplit("/", 1)[-1]
+    return (reel_id, model_size, compute_type, language, initial_prompt or None)
+
+def _cache_get(url: str, language: Optional[str], model_size: str, compute_type: str, initial_prompt: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    return _CACHE.get(_cache_key(url, language, model_size, compute_type, initial_prompt))
+
+def _cache_set(url: str, language: Optional[str], model_size: str, compute_type: str, data: Dict[str, Any], initial_prompt: Optional[str] = None) -> None:
+    _CACHE.set(_cache_key(url, language, model_size, compute_type, initial_prompt), data)
+
+# SRTs returned by /transcribe live at one stable path per cache key, so a hit reuses the file
+SRT_DIR = os.path.join(CACHE_DIR, "srt")
+os.makedirs(SRT_DIR, exist_ok=True)
+
+def _srt_path(url: str, language: Optional[str], model_size: str, compute_type: str, initial_prompt: Optional[str] = None) -> str:
+    key = _cache_key(url, language, model_size, compute_type, initial_prompt)
+    digest = hashlib.sha256(repr(key).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(SRT_DIR, f"{key[0]}-{digest}.srt")
+
+SRT_MAX_FILES = int(os.environ.get("SRT_MAX_FILES", "1000"))
+
+def _prune_srt_dir() -> None:
+    # Keep the SRT dir bounded: drop the oldest files past SRT_MAX_FILES
+    try:
+        entries = sorted(os.scandir(SRT_DIR), key=lambda e: e.stat().st_mtime)
+    except OSError:
+        return
+    for entry in entries[:max(len(entries) - SRT_MAX_FILES, 0)]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
 
 # -------------------------------------------------
 # Cookie resolution & helpers
@@ -110,69 +276,154 @@ def _resolve_cookiefile(explicit_path: Optional[str]) -> Optional[str]:
 # -------------------------------------------------
 # Core functions
 # -------------------------------------------------
-def download_audio(url: str, cookies_path: Optional[str] = None) -> str:
-    url = _clean_instagram_reel_url(url)
-    if not INSTAGRAM_RE.match(url):
-        raise ValueError("This does not look like a valid Instagram Reel URL.")
-
-    tmpdir = tempfile.mkdtemp(prefix="igdl_")
-    outtmpl = os.path.join(tmpdir, "%(id)s.%(ext)s")
-
-    ydl_opts: Dict[str, Any] = {
-        "format": "bestaudio/best",
-        "noplaylist": True,
-        "outtmpl": outtmpl,
-        "quiet": True,
-        "nocheckcertificate": True,
-        "http_headers": {
-            "User-Agent": USER_AGENT,
-            "Referer": "https://www.instagram.com/",
-            "Accept-Language": "en-US,en;q=0.9",
-        },
-    }
+_YDL_LOCAL = threading.local()
+_YDL_CACHE_SIZE = 4
 
+def _cookie_mtime(cookiefile: Optional[str]) -> Optional[float]:
+    try:
+        return os.path.getmtime(cookiefile) if cookiefile else None
+    except OSError:
+        return None
+
+def _get_ydl(cookiefile: Optional[str], cookies_from_browser: Optional[str]) -> yt_dlp.YoutubeDL:
+    # Building a YoutubeDL (extractor/plugin discovery) is costly, so keep a few per
+    # cookie source (LRU). Instances are per thread: the output dir is set per download.
+    instances = getattr(_YDL_LOCAL, "instances", None)
+    if instances is None:
+        instances = _YDL_LOCAL.instances = OrderedDict()
+    key = (cookiefile, cookies_from_browser)
+    entry = instances.get(key)
+    if entry is not None and entry[1] != _cookie_mtime(cookiefile):
+        # Cookie file was replaced (e.g. rotated COOKIES_FILE): reload it
+        del instances[key]
+        entry[0].close()
+        entry = None
+    if entry is None:
+        ydl_opts: Dict[str, Any] = {
+            "format": "bestaudio/best",
+            "noplaylist": True,
+            "outtmpl": "%(id)s.%(ext)s",
+            "quiet": True,
+            "nocheckcertificate": True,
+            # Hand Whisper 16 kHz mono PCM so it doesn't have to resample per call
+            "postprocessors": [{"key": "FFmpegExtractAudio", "preferredcodec": "wav"}],
+            "postprocessor_args": {"extractaudio": ["-ar", "16000", "-ac", "1", "-acodec", "pcm_s16le"]},
+            "http_headers": {
+                "User-Agent": USER_AGENT,
+                "Referer": "https://www.instagram.com/",
+                "Accept-Language": "en-US,en;q=0.9",
+            },
+        }
+        if cookiefile:
+            ydl_opts["cookiefile"] = cookiefile
+        elif cookies_from_browser:
+            # Works on your local machine only
+            ydl_opts["cookiesfrombrowser"] = (cookies_from_browser,)
+        instances[key] = (yt_dlp.YoutubeDL(ydl_opts), _cookie_mtime(cookiefile))
+    instances.move_to_end(key)
+    while len(instances) > _YDL_CACHE_SIZE:
+        _, (old, _) = instances.popitem(last=False)
+        old.close()
+    return instances[key][0]
+
+def _save_ydl_cookies(ydl: yt_dlp.YoutubeDL, cookiefile: Optional[str], cookies_from_browser: Optional[str]) -> None:
+    # Write refreshed cookies back like the old `with YoutubeDL(...)` did on exit,
+    # and remember the new mtime so our own save doesn't look like a rotation
+    try:
+        ydl.save_cookies()
+    except OSError as e:
+        logging.warning("Could not write cookies back to %s: %s", cookiefile, e)
+    instances = _YDL_LOCAL.instances
+    key = (cookiefile, cookies_from_browser)
+    if key in instances:
+        instances[key] = (ydl, _cookie_mtime(cookiefile))
+
+def download_audio(url: str, cookies_path: Optional[str] = None) -> str:
+    # url must already be cleaned with _clean_instagram_reel_url
     cookiefile = _resolve_cookiefile(cookies_path)
-    if cookiefile:
-        ydl_opts["cookiefile"] = cookiefile
-    elif LOCAL_COOKIES_BROWSER in {"chrome", "edge", "firefox"}:
-        # Works on your local machine only
-        ydl_opts["cookiesfrombrowser"] = (LOCAL_COOKIES_BROWSER,)
+    cookies_from_browser = None
+    if not cookiefile and LOCAL_COOKIES_BROWSER in {"chrome", "edge", "firefox"}:
+        cookies_from_browser = LOCAL_COOKIES_BROWSER
 
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+    tmpdir = tempfile.mkdtemp(prefix="igdl_", dir=REEL_TMP)
+    ydl = _get_ydl(cookiefile, cookies_from_browser)
+    ydl.params["paths"] = {"home": tmpdir}
+    try:
         info = ydl.extract_info(url, download=True)
-        filename = ydl.prepare_filename(info)
+    except Exception:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+        raise
+    finally:
+        _save_ydl_cookies(ydl, cookiefile, cookies_from_browser)
+    filename = os.path.splitext(ydl.prepare_filename(info))[0] + ".wav"
     return filename
 
-def transcribe(audio_path: str, language: Optional[str], model_size: str, compute_type: str) -> Dict[str, Any]:
+def load_audio(audio_path: str) -> Union[np.ndarray, str]:
+    # download_audio already produced 16 kHz mono s16le, so read the samples
+    # straight into memory instead of letting faster-whisper spawn ffmpeg again
+    try:
+        with wave.open(audio_path, "rb") as w:
+            if (w.getframerate(), w.getnchannels(), w.getsampwidth()) != (16000, 1, 2):
+                return audio_path
+            buf = w.readframes(w.getnframes())
+    except (wave.Error, EOFError):
+        return audio_path
+    return np.frombuffer(buf, np.int16).astype(np.float32) / 32768.0
+
+def transcribe_segments(audio_path: str, language: Optional[str], model_size: str, compute_type: str, initial_prompt: Optional[str] = None, batch_size: int = 8) -> Tuple[Iterator[Dict[str, Any]], Any]:
+    # Segments are decoded lazily as the returned iterator is consumed
     model = get_model(model_size=model_size, compute_type=compute_type)
-    segments, info = model.transcribe(audio_path, language=language, beam_size=1)
-    result_segments = []
-    full_text_parts = []
-    for seg in segments:
-        text = seg.text.strip()
-        result_segments.append({
+    # The batched pipeline already skips previous-text conditioning and
+    # temperature fallback, which suits short reels
+    segments, info = model.transcribe(
+        load_audio(audio_path),
+        language=language,
+        vad_filter=True,
+        vad_parameters={"min_silence_duration_ms": 500},
+        batch_size=batch_size,
+        beam_size=1,
+        # The batched pipeline defaults to one segment per VAD chunk (up to 30s);
+        # keep timestamp tokens so the SRT gets one cue per utterance
+        without_timestamps=False,
+        initial_prompt=initial_prompt or None,
+    )
+    segment_dicts = (
+        {
             "id": seg.id,
             "start": round(seg.start, 2),
             "end": round(seg.end, 2),
-            "text": text
-        })
-        if text:
-            full_text_parts.append(text)
+            "text": seg.text.strip()
+        }
+        for seg in segments
+    )
+    return segment_dicts, info
+
+def _build_result(segments: List[Dict[str, Any]], info: Any, language: Optional[str]) -> Dict[str, Any]:
     return {
         "duration": round(getattr(info, "duration", 0.0), 2) if hasattr(info, "duration") else None,
         "language": getattr(info, "language", None) or language,
-        "segments": result_segments,
-        "text": " ".join(full_text_parts).strip()
+        "segments": segments,
+        "text": " ".join(s["text"] for s in segments if s["text"]).strip()
     }
 
+def transcribe(audio_path: str, language: Optional[str], model_size: str, compute_type: str, initial_prompt: Optional[str] = None) -> Dict[str, Any]:
+    segments, info = transcribe_segments(audio_path, language, model_size, compute_type, initial_prompt)
+    return _build_result(list(segments), info, language)
+
+def _srt_time(t: float) -> str:
+    # Round once to whole milliseconds, then stay in integers (no ",1000" at boundaries)
+    h, rem = divmod(int(t * 1000 + 0.5), 3_600_000)
+    m, rem = divmod(rem, 60_000)
+    s, ms = divmod(rem, 1000)
+    return f"{h:02d}:{m:02d}:{s:02d},{ms:03d}"
+
 def write_srt(segments: List[Dict[str, Any]], out_path: str) -> str:
-    def fmt(t: float) -> str:
-        h = int(t // 3600); m = int((t % 3600) // 60); s = int(t % 60)
-        ms = int(round((t - int(t)) * 1000))
-        return f"{h:02d}:{m:02d}:{s:02d},{ms:03d}"
+    blocks = [
+        f"{i}\n{_srt_time(seg['start'])} --> {_srt_time(seg['end'])}\n{seg['text']}\n"
+        for i, seg in enumerate(segments, start=1)
+    ]
     with open(out_path, "w", encoding="utf-8") as f:
-        for i, seg in enumerate(segments, start=1):
-            f.write(f"{i}\n{fmt(seg['start'])} --> {fmt(seg['end'])}\n{seg['text']}\n\n")
+        f.write("\n".join(blocks))
     return out_path
 
 # -------------------------------------------------
@@ -184,7 +435,22 @@ class TranscribeRequest(BaseModel):
     language: Optional[str] = Field(default=None)
     cookies_path: Optional[str] = Field(default=None)  # optional per-call override
     model_size: str = Field(default=os.environ.get("MODEL_SIZE", "small"))
-    compute_type: str = Field(default=os.environ.get("COMPUTE_TYPE", "int8"))
+    compute_type: str = Field(default=os.environ.get("COMPUTE_TYPE", "auto"))
+    initial_prompt: str = Field(default="")  # e.g. punctuation/style hints for the reel's language
+
+    @field_validator("model_size")
+    @classmethod
+    def _check_model_size(cls, v: str) -> str:
+        if v not in ALLOWED_MODEL_SIZES:
+            raise ValueError(f"model_size must be one of: {', '.join(sorted(ALLOWED_MODEL_SIZES))}")
+        return v
+
+    @field_validator("compute_type")
+    @classmethod
+    def _check_compute_type(cls, v: str) -> str:
+        if v not in ALLOWED_COMPUTE_TYPES:
+            raise ValueError(f"compute_type must be one of: {', '.join(sorted(ALLOWED_COMPUTE_TYPES))}")
+        return v
 
 class Segment(BaseModel):
     id: int
@@ -203,7 +469,12 @@ class TranscribeResult(BaseModel):
 class BatchResponse(BaseModel):
     results: List[TranscribeResult]
 
-app = FastAPI(title="Instagram Reel Transcriber", version="1.5.0")
+app = FastAPI(title="Instagram Reel Transcriber", version="1.5.0", default_response_class=ORJSONResponse)
+
+@app.on_event("startup")
+async def _warm():
+    # Load weights at boot so the first /submit doesn't pay the cold start
+    warm_model(os.environ.get("MODEL_SIZE","small"), os.environ.get("COMPUTE_TYPE","auto"))
 
 FORM_HTML = """<!doctype html>
 <html lang="en"><meta charset="utf-8"><meta name="viewport" content="width=device-width, initial-scale=1">
@@ -254,39 +525,118 @@ def diag():
 
 @app.post("/submit", response_class=HTMLResponse)
 def submit(url: str = Form(...), language: Optional[str] = Form(None)):
+    model_size = os.environ.get("MODEL_SIZE","small")
+    compute_type = os.environ.get("COMPUTE_TYPE","auto")
     try:
-        media_path = download_audio(url, None)
-        data = transcribe(media_path, language, os.environ.get("MODEL_SIZE","small"), os.environ.get("COMPUTE_TYPE","int8"))
-        srt_path = os.path.splitext(media_path)[0] + ".srt"
-        write_srt(data["segments"], srt_path)
         cleaned = _clean_instagram_reel_url(url)
-        transcript = data.get("text","")
+    except Exception as e:
+        return HTMLResponse(FORM_HTML + f"<p style='color:#c00'>Error: {e}</p>", status_code=400)
+    data = _cache_get(cleaned, language, model_size, compute_type)
+    if data is not None:
+        transcript = html.escape(data.get("text",""))
         return HTMLResponse(
             FORM_HTML + f"<h2>Transcript</h2><pre>{transcript}</pre><p><small>URL: {cleaned}</small></p>"
         )
-    except Exception as e:
-        return HTMLResponse(FORM_HTML + f"<p style='color:#c00'>Error: {e}</p>", status_code=400)
 
-@app.post("/transcribe", response_model=BatchResponse)
-def api_transcribe(req: TranscribeRequest):
-    out_results: List[TranscribeResult] = []
+    def stream():
+        # Send the page right away; download, VAD and feature extraction come after
+        yield FORM_HTML
+        media_path = None
+        in_pre = False
+        result_segments: List[Dict[str, Any]] = []
+        try:
+            media_path = download_audio(cleaned, None)
+            # batch_size=1 so each (<=30s) window is flushed as soon as it is decoded
+            segments, info = transcribe_segments(media_path, language, model_size, compute_type, batch_size=1)
+            yield "<h2>Transcript</h2><pre>"
+            in_pre = True
+            for seg in segments:
+                result_segments.append(seg)
+                if seg["text"]:
+                    yield html.escape(seg["text"]) + " "
+        except Exception as e:
+            yield ("</pre>" if in_pre else "") + f"<p style='color:#c00'>Error: {e}</p>"
+            return
+        finally:
+            # The web form never hands out the SRT, so drop the whole download dir
+            if media_path:
+                shutil.rmtree(os.path.dirname(media_path), ignore_errors=True)
+        yield f"</pre><p><small>URL: {cleaned}</small></p>"
+        _cache_set(cleaned, language, model_size, compute_type, _build_result(result_segments, info, language))
+
+    return StreamingResponse(stream(), media_type="text/html")
+
+DOWNLOAD_AHEAD = max(int(os.environ.get("DOWNLOAD_AHEAD", "3")), 1)
+_ASR_EXECUTOR = ThreadPoolExecutor(max_workers=CT2_NUM_WORKERS, thread_name_prefix="asr")
+
+# BatchResponse only documents the schema; results are built server-side, so skip validating them
+@app.post("/transcribe", response_model=None, responses={200: {"model": BatchResponse}})
+async def api_transcribe(req: TranscribeRequest):
+    cleaned_urls: List[str] = []
     for raw_url in req.urls:
         try:
-            media_path = download_audio(raw_url, req.cookies_path)
-            data = transcribe(media_path, req.language, req.model_size, req.compute_type)
-            srt_path = os.path.splitext(media_path)[0] + ".srt"
-            write_srt(data["segments"], srt_path)
-            out_results.append(TranscribeResult(
-                url=_clean_instagram_reel_url(raw_url),
-                duration=data.get("duration"),
-                language=data.get("language"),
-                text=data.get("text", ""),
-                segments=[Segment(**s) for s in data.get("segments", [])],
-                srt_path=srt_path
-            ))
+            cleaned_urls.append(_clean_instagram_reel_url(raw_url))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Failed for {raw_url}: {e}")
+
+    cached = [_cache_get(url, req.language, req.model_size, req.compute_type, req.initial_prompt) for url in cleaned_urls]
+    # Downloads run a few reels ahead of transcription: enough to overlap the two,
+    # while keeping only DOWNLOAD_AHEAD WAVs in REEL_TMP at a time
+    ahead = asyncio.Semaphore(DOWNLOAD_AHEAD)
+    aborted = asyncio.Event()
+
+    async def fetch(url: str) -> Optional[str]:
+        await ahead.acquire()
+        if aborted.is_set():
+            ahead.release()
+            return None
+        return await asyncio.to_thread(download_audio, url, req.cookies_path)
+
+    downloads = [
+        None if hit is not None else asyncio.create_task(fetch(url))
+        for url, hit in zip(cleaned_urls, cached)
+    ]
+    loop = asyncio.get_running_loop()
+    out_results: List[Dict[str, Any]] = []
+    for i, (raw_url, cleaned, data, download) in enumerate(zip(req.urls, cleaned_urls, cached, downloads)):
+        try:
+            srt_path = _srt_path(cleaned, req.language, req.model_size, req.compute_type, req.initial_prompt)
+            if download is None:
+                if not os.path.exists(srt_path):
+                    write_srt(data["segments"], srt_path)
+            else:
+                media_path = await download
+                try:
+                    # Own executor, so transcription never queues behind downloads
+                    data = await loop.run_in_executor(
+                        _ASR_EXECUTOR, transcribe, media_path, req.language, req.model_size, req.compute_type, req.initial_prompt
+                    )
+                finally:
+                    shutil.rmtree(os.path.dirname(media_path), ignore_errors=True)
+                    ahead.release()
+                _cache_set(cleaned, req.language, req.model_size, req.compute_type, data, req.initial_prompt)
+                write_srt(data["segments"], srt_path)
+                _prune_srt_dir()
+            out_results.append({
+                "url": cleaned,
+                "duration": data.get("duration"),
+                "language": data.get("language"),
+                "text": data.get("text", ""),
+                "segments": data["segments"],
+                "srt_path": srt_path,
+            })
         except Exception as e:
+            # Cancelling can't stop a download thread, so let started downloads finish and
+            # discard their audio; queued ones wake up, see `aborted` and skip
+            aborted.set()
+            for _ in range(DOWNLOAD_AHEAD):
+                ahead.release()
+            leftovers = [d for d in downloads[i + 1:] if d is not None]
+            for res in await asyncio.gather(*leftovers, return_exceptions=True):
+                if isinstance(res, str):
+                    shutil.rmtree(os.path.dirname(res), ignore_errors=True)
             raise HTTPException(status_code=400, detail=f"Failed for {raw_url}: {e}")
-    return BatchResponse(results=out_results)
+    return ORJSONResponse({"results": out_results})
 
 # -------------------------------------------------
 # CLI
@@ -296,15 +646,31 @@ def cli():
     parser.add_argument("urls", nargs="*", help="One or more Instagram Reel URLs")
     parser.add_argument("--language","-l", default=None, help="Force language code (e.g., en, it). Default: auto-detect")
     parser.add_argument("--cookies", default=None, help="Path to cookies.txt for private reels (optional).")
-    parser.add_argument("--model-size", default=os.environ.get("MODEL_SIZE","small"), help="Whisper model size (tiny/base/small/medium/large-v3)")
-    parser.add_argument("--compute-type", default=os.environ.get("COMPUTE_TYPE","int8"), help="Compute type (int8/int8_float16/float16/float32)")
+    parser.add_argument("--model-size", default=os.environ.get("MODEL_SIZE","small"), help="Whisper model (tiny/base/small/medium/large-v3, distil-small.en/distil-large-v3, or a CT2 repo id)")
+    parser.add_argument("--compute-type", default=os.environ.get("COMPUTE_TYPE","auto"), help="Compute type (auto/int8/int8_float16/bfloat16/float16/float32)")
+    parser.add_argument("--initial-prompt", default="", help="Text to prime the decoder with (e.g., punctuation hints for the reel's language)")
     parser.add_argument("--serve", action="store_true", help="Run the API/web server instead of the CLI")
     parser.add_argument("--host", default="0.0.0.0")
     parser.add_argument("--port", default=8000, type=int)
+    parser.add_argument("--workers", default=None, type=int, help="Server worker processes. Default: WEB_CONCURRENCY, else 1 on GPU / 2 on CPU")
     args = parser.parse_args()
 
     if args.serve:
-        uvicorn.run("app:app", host=args.host, port=args.port, reload=False)
+        workers = args.workers or int(os.environ.get("WEB_CONCURRENCY", 0))
+        if not workers:
+            # One process owns the GPU and batches on it. On CPU each process already
+            # spreads inference over its share of the cores.
+            workers = 1 if _resolve_device() == "cuda" else min(2, os.cpu_count() or 1)
+        os.environ["WEB_CONCURRENCY"] = str(workers)  # read by _cpu_threads() in each worker
+        uvicorn.run(
+            "app:app",
+            host=args.host,
+            port=args.port,
+            reload=False,
+            loop="uvloop" if sys.platform != "win32" else "auto",  # uvloop has no Windows build
+            http="httptools",
+            workers=workers,
+        )
         return
 
     if not args.urls:
@@ -313,11 +679,16 @@ def cli():
     for raw_url in args.urls:
         try:
             print(f"Downloading: {raw_url}")
-            media_path = download_audio(raw_url, args.cookies)
-            print(f"Saved media: {media_path}")
+            cleaned = _clean_instagram_reel_url(raw_url)
+            media_path = download_audio(cleaned, args.cookies)
+            print(f"Downloaded audio: {media_path}")
             print("Transcribing...")
-            data = transcribe(media_path, args.language, args.model_size, args.compute_type)
-            srt_path = os.path.splitext(media_path)[0] + ".srt"
+            try:
+                data = transcribe(media_path, args.language, args.model_size, args.compute_type, args.initial_prompt)
+            finally:
+                # REEL_TMP may be RAM-backed; the SRT goes to the working directory instead
+                shutil.rmtree(os.path.dirname(media_path), ignore_errors=True)
+            srt_path = os.path.abspath(cleaned.rsplit("/", 1)[-1] + ".srt")
             write_srt(data["segments"], srt_path)
             print("----- TRANSCRIPT (plain text) -----")
             print(data["text"])